@@ -1,5 +1,39 @@
 import itertools
 import random
+from collections import defaultdict, deque
+
+
+def neighbour_table(height, width):
+    """
+    Returns a dict mapping every cell of a height x width board
+    to the frozenset of cells within one row and column of it,
+    not including the cell itself.
+    """
+    table = {}
+    for i in range(height):
+        for j in range(width):
+            table[(i, j)] = frozenset(
+                (row, col)
+                for row in range(i - 1, i + 2)
+                for col in range(j - 1, j + 2)
+                if 0 <= row < height and 0 <= col < width
+                and (row, col) != (i, j)
+            )
+    return table
+
+
+# Neighbour table for the default 8x8 board, shared by every instance
+_NEIGHBOURS_8x8 = neighbour_table(8, 8)
+
+
+def _neighbours_for(height, width):
+    """
+    Returns the neighbour table for a board, reusing the
+    precomputed one for the default size.
+    """
+    if (height, width) == (8, 8):
+        return _NEIGHBOURS_8x8
+    return neighbour_table(height, width)
 
 
 class Minesweeper():
@@ -7,28 +41,32 @@ class Minesweeper():
     Minesweeper game representation
     """
 
-    def __init__(self, height=8, width=8, mines=8):
+    def __init__(self, height=8, width=8, mines=8, rng=None):
 
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
         self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Source of randomness, owned by this game unless one is given
+        self._random = rng if rng is not None else random.Random()
+
+        # Initialize an empty field with no mines,
+        # stored row by row with one byte per cell
+        self.board = bytearray(height * width)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        for k in self._random.sample(range(height * width), mines):
+            self.mines.add(divmod(k, width))
+            self.board[k] = 1
+
+        # Mines never move, so count every cell's nearby mines up front
+        # by crediting each mine to its neighbours
+        self._counts = bytearray(height * width)
+        neighbours = _neighbours_for(height, width)
+        for mine in self.mines:
+            for i, j in neighbours[mine]:
+                self._counts[i * width + j] += 1
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -41,7 +79,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.board[i * self.width + j]:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +88,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return self.board[i * self.width + j] != 0
 
     def nearby_mines(self, cell):
         """
@@ -59,23 +97,8 @@ class Minesweeper():
         not including the cell itself.
         """
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self._counts[i * self.width + j]
 
     def won(self):
         """
@@ -84,6 +107,13 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def _key(sentence):
+    """
+    Returns a hashable snapshot of a sentence's cells and count.
+    """
+    return (frozenset(sentence.cells), sentence.count)
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
@@ -96,35 +126,46 @@ class Sentence():
     # we can update our sentences to simplify them and 
     # potentially draw new conclusions.
 
+    __slots__ = ("cells", "count", "_len")
+
     def __init__(self, cells, count):
         self.cells = set(cells)
         self.count = count
+        # Kept in step with self.cells by mark_mine/mark_safe
+        self._len = len(self.cells)
 
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        # Only stable while the sentence is not marked, which is why
+        # the AI keys its knowledge base by a snapshot from _key()
+        return hash(_key(self))
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
     def known_mines(self):
         """
         Returns the set of all cells in self.cells known to be mines.
+        The set is not copied, so callers that go on to mark cells
+        must take a snapshot of it first.
         """
-        if self.count == len(self.cells):
-            return set(self.cells)
+        if self.count == self._len:
+            return self.cells
         else:
-            return set()
-        raise NotImplementedError
+            return frozenset()
 
     def known_safes(self):
         """
         Returns the set of all cells in self.cells known to be safe.
+        The set is not copied, so callers that go on to mark cells
+        must take a snapshot of it first.
         """
         if self.count == 0:
-            return set(self.cells)
+            return self.cells
         else:
-            return set()
-        raise NotImplementedError
+            return frozenset()
 
     def mark_mine(self, cell):
         """
@@ -133,9 +174,8 @@ class Sentence():
         """
         if cell in self.cells:
             self.cells.remove(cell)
+            self._len -= 1
             self.count -= 1
-        return
-        raise NotImplementedError
 
     def mark_safe(self, cell):
         """
@@ -144,8 +184,7 @@ class Sentence():
         """
         if cell in self.cells:
             self.cells.remove(cell)
-        return
-        raise NotImplementedError
+            self._len -= 1
 
 
 class MinesweeperAI():
@@ -153,12 +192,15 @@ class MinesweeperAI():
     Minesweeper game player
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, rng=None):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Source of randomness, owned by this player unless one is given
+        self._random = rng if rng is not None else random.Random()
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
@@ -166,8 +208,21 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Cells that are neither chosen nor known to be mines,
+        # from which random moves are drawn
+        self._candidates = {(i, j) for i in range(height) for j in range(width)}
+
+        # Sentences about the game known to be true, in insertion order,
+        # keyed by _key() so that duplicates are found in constant time
+        self.knowledge = {}
+        # Sentences in self.knowledge that mention each cell
+        self._cell_index = defaultdict(list)
+        # Sentences rewritten by mark_mine/mark_safe that still have to be
+        # checked for known cells and compared against the knowledge base
+        self._changed = deque()
+
+        # Neighbours of every cell, computed once for the fixed board size
+        self._neighbours = _neighbours_for(height, width)
 
     def mark_mine(self, cell):
         """
@@ -175,8 +230,20 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
+        self._candidates.discard(cell)
+        for sentence in self._cell_index.pop(cell, ()):
+            key = _key(sentence)
+            if self.knowledge.get(key) is not sentence:
+                # Already dropped from the knowledge base
+                continue
+            del self.knowledge[key]
             sentence.mark_mine(cell)
+            # Empty sentences carry no information, and one that now
+            # duplicates another sentence is left out as well
+            if not sentence.cells:
+                continue
+            if self.knowledge.setdefault(_key(sentence), sentence) is sentence:
+                self._changed.append(sentence)
 
     def mark_safe(self, cell):
         """
@@ -184,8 +251,43 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
+        for sentence in self._cell_index.pop(cell, ()):
+            key = _key(sentence)
+            if self.knowledge.get(key) is not sentence:
+                # Already dropped from the knowledge base
+                continue
+            del self.knowledge[key]
             sentence.mark_safe(cell)
+            # Empty sentences carry no information, and one that now
+            # duplicates another sentence is left out as well
+            if not sentence.cells:
+                continue
+            if self.knowledge.setdefault(_key(sentence), sentence) is sentence:
+                self._changed.append(sentence)
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base unless an equal one
+        is already known. Returns True if the sentence was added.
+        """
+        # Marks made before the sentence was built never reach it,
+        # so drop cells already known to be safe or mines up front
+        for cll in sentence.cells & self.safes:
+            sentence.mark_safe(cll)
+        for cll in sentence.cells & self.mines:
+            sentence.mark_mine(cll)
+        if not sentence.cells:
+            return False
+        key = _key(sentence)
+        if key in self.knowledge:
+            return False
+        self.knowledge[key] = sentence
+        for cell in sentence.cells:
+            self._cell_index[cell].append(sentence)
+        if sentence.count == 0 or sentence.count == sentence._len:
+            # Left for add_knowledge to resolve
+            self._changed.append(sentence)
+        return True
 
     def add_knowledge(self, cell, count):
         """
@@ -206,36 +308,80 @@ class MinesweeperAI():
         # print(f"{cell} move made and marked safe")
         # 1) mark the cell as a move that has been made
         self.moves_made.add(cell)
+        self._candidates.discard(cell)
         # 2) mark the cell as safe
         self.mark_safe(cell)
         # 3) add a new sentence to the AI's knowledge base
         #        based on the value of `cell` and `count`
-        sent = Sentence(self.find_neighbours(cell), count)
+        sent = Sentence(self._neighbours[cell], count)
         self.add_safes(sent)
         self.add_mines(sent)
-        if sent not in self.knowledge:            
-            self.knowledge.append(sent)
+        # Only pairs involving a newly added or rewritten sentence can
+        # produce new subset relationships, so keep a worklist of those
+        # instead of rescanning every pair of the knowledge base.
+        # A sentence whose cells are all safe or all mines has just been
+        # fully resolved above, so it is neither stored nor compared,
+        # but the sentences its marks rewrote still are.
+        pending = deque()
+        if sent.count != 0 and sent.count != sent._len and self.add_sentence(sent):
+            pending.append(sent)
             # print(f"{sent} is added to the knowledge")
         # 4) mark any additional cells as safe or as mines
         #    if it can be concluded based on the AI's knowledge base
         # 5) add any new sentences to the AI's knowledge base
         #    if they can be inferred from existing knowledge
         # print("knowledge now\n----------")
-        # for l in self.knowledge:
+        # for l in self.knowledge.values():
         #     print(l)
         # print("------------\n")
-        for snt in self.knowledge:
-            for snt2 in self.knowledge:
-                if snt != snt2 and snt.cells < snt2.cells:
-                    new_sent = Sentence(snt2.cells - snt.cells, snt2.count - snt.count)
-                    # print(f"{new_sent} is the new sentence")
-                    self.add_safes(new_sent)           
+        while pending or self._changed:
+            # Marking cells rewrites sentences in place; a rewritten one
+            # may now pin down its own cells, or else must be compared again
+            while self._changed:
+                snt = self._changed.popleft()
+                if self.knowledge.get(_key(snt)) is not snt:
+                    continue
+                if snt.count == 0 or snt.count == snt._len:
+                    self.add_safes(snt)
+                    self.add_mines(snt)
+                else:
+                    pending.append(snt)
+            if not pending:
+                break
+            snt = pending.popleft()
+            cells = snt.cells
+            knowledge = self.knowledge
+            # Sentences dropped from the knowledge base stop being updated
+            # when cells are marked, so they must not be used for inference
+            if knowledge.get(_key(snt)) is not snt:
+                continue
+            # Only sentences sharing a cell with snt can be a subset or
+            # superset of it. Collect them up front, since marking cells
+            # updates the index; sentences added meanwhile are queued.
+            # The index can also still hold dropped sentences.
+            index = self._cell_index
+            candidates = {
+                id(other): other
+                for c in cells
+                for other in index.get(c, ())
+            }
+            for other in candidates.values():
+                if other is snt or knowledge.get(_key(other)) is not other:
+                    continue
+                if snt._len < other._len and cells.issubset(other.cells):
+                    new_sent = Sentence(other.cells - cells, other.count - snt.count)
+                elif other._len < snt._len and other.cells.issubset(cells):
+                    new_sent = Sentence(cells - other.cells, snt.count - other.count)
+                else:
+                    continue
+                # print(f"{new_sent} is the new sentence")
+                if new_sent.count == 0 or new_sent.count == new_sent._len:
+                    self.add_safes(new_sent)
                     self.add_mines(new_sent)
-                    if new_sent.count != 0  and new_sent.count != len(new_sent.cells) and new_sent not in self.knowledge:
-                        self.knowledge.append(new_sent)
-                        # print(f"{new_sent} is added to the knowledge")
-        return
-        raise NotImplementedError
+                    continue
+                if self.add_sentence(new_sent):
+                    pending.append(new_sent)
+                    # print(f"{new_sent} is added to the knowledge")
 
     def make_safe_move(self):
         """
@@ -246,12 +392,13 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        for cll in self.safes:
-            if cll not in self.moves_made:
-                self.moves_made.add(cll)
-                return cll
-        return None
-        raise NotImplementedError
+        available = self.safes - self.moves_made
+        if not available:
+            return None
+        cll = next(iter(available))
+        self.moves_made.add(cll)
+        self._candidates.discard(cll)
+        return cll
 
     def make_random_move(self):
         """
@@ -260,30 +407,16 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        while True:
-            cll = (random.randint(0, self.height - 1), random.randint(0, self.width - 1))
-            if cll not in self.moves_made:
-                if cll not in self.mines:
-                    return cll
-        raise NotImplementedError
+        if not self._candidates:
+            return None
+        return self._random.choice(tuple(self._candidates))
 
     def find_neighbours(self, cell):
         """
         Returns a set of cell coordinates on the Minesweeper board. 
         Each tuple represents a neighbour cell.
         """
-        height = self.height
-        width = self.width     
-        answer = set()
-        i, j = cell
-        # print(cell)
-        for row in range(i-1, i+2):
-            for col in range(j-1, j+2):
-                if 0 <= row < height and 0 <= col < width:
-                    answer.add((row, col))
-        answer.remove((i, j))
-        # print(answer)
-        return answer
+        return set(self._neighbours[cell])
 
     def add_safes(self, sentence):
         """
@@ -291,17 +424,18 @@ class MinesweeperAI():
             1) marks them as safe
             2) adds them to the safes set()
         """
-        for cll in sentence.known_safes():
+        # Snapshot the sentence first, since marking rewrites it in place
+        # when it is part of the knowledge base
+        cells = set(sentence.known_safes())
+        count = sentence.count
+        for cll in list(cells):
             # print(f"sentence: {sentence}")
             self.mark_safe(cll)
             self.safes.add(cll)
             # print(f"{cll} is safe")
-            if len(sentence.cells) > 1:
-                copy = set(sentence.cells)
-                copy.remove(cll)
-                new_sent = Sentence(copy, sentence.count) 
-                if new_sent not in self.knowledge:            
-                    self.knowledge.append(new_sent) 
+            if len(cells) > 1:
+                new_sent = Sentence(cells - {cll}, count)
+                self.add_sentence(new_sent)
 
     def add_mines(self, sentence):
         """
@@ -309,13 +443,14 @@ class MinesweeperAI():
             1) marks them as mine
             2) adds them to the mines set()
         """
-        for cll in sentence.known_mines():
+        # Snapshot the sentence first, since marking rewrites it in place
+        # when it is part of the knowledge base
+        cells = set(sentence.known_mines())
+        count = sentence.count
+        for cll in list(cells):
             self.mark_mine(cll)
             self.mines.add(cll)
             # print(f"{cll} is mine")
-            if len(sentence.cells) > 1:
-                copy = set(sentence.cells)
-                copy.remove(cll)
-                new_sent = Sentence(copy, sentence.count - 1) 
-                if new_sent not in self.knowledge:            
-                    self.knowledge.append(new_sent)         
+            if len(cells) > 1:
+                new_sent = Sentence(cells - {cll}, count - 1)
+                self.add_sentence(new_sent)
@@ -0,0 +1,34 @@
+import unittest
+
+from minesweeper import MinesweeperAI
+
+
+class MinesweeperAITest(unittest.TestCase):
+
+    def test_marking_resolves_rewritten_sentences(self):
+        # 1x5 board with mines at (0, 0) and (0, 3):
+        # revealing (0, 2) leaves {(0, 0)} = 1 in the knowledge base
+        ai = MinesweeperAI(height=1, width=5)
+        ai.add_knowledge((0, 1), 1)
+        ai.add_knowledge((0, 2), 1)
+        self.assertIn((0, 0), ai.mines)
+
+    def test_resolved_move_still_updates_knowledge(self):
+        # 1x5 board with a mine at (0, 0): revealing (0, 2) resolves
+        # its own neighbours, which leaves {(0, 0)} = 1 behind
+        ai = MinesweeperAI(height=1, width=5)
+        ai.add_knowledge((0, 1), 1)
+        ai.add_knowledge((0, 2), 0)
+        self.assertIn((0, 0), ai.mines)
+
+    def test_new_sentences_skip_known_cells(self):
+        # 1x3 board with a mine at (0, 2): once (0, 0) is known safe,
+        # revealing (0, 1) only says something about (0, 2)
+        ai = MinesweeperAI(height=1, width=3)
+        ai.add_knowledge((0, 0), 0)
+        ai.add_knowledge((0, 1), 1)
+        self.assertIn((0, 2), ai.mines)
+
+
+if __name__ == "__main__":
+    unittest.main()